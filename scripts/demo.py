@@ -1,5 +1,5 @@
-from st_augmentor import singular_they_augmentor
-from gec_st_augmentor import st_augmentor_for_gec
+from st_augmentor import singular_they_augmentor_batch
+from gec_st_augmentor import st_augmentor_for_gec_batch
 from utils.align import align
 
 
@@ -21,12 +21,13 @@ ungrammatical_texts = [
 ]
 
 print('Singular `they` augmentation:')
-for i, text in enumerate(texts):
-    print(f'{i+1}:\tOriginal: {text}\n\tAugmented: {singular_they_augmentor(text)}')
+augmented_texts = singular_they_augmentor_batch(texts)
+for i, (text, augmented) in enumerate(zip(texts, augmented_texts)):
+    print(f'{i+1}:\tOriginal: {text}\n\tAugmented: {augmented}')
 
 print('Singular `they` augmentation for GEC:')
-for i, (src, tgt) in enumerate(zip(ungrammatical_texts, texts)):
-    augment = st_augmentor_for_gec(src, tgt)
+augments = st_augmentor_for_gec_batch(ungrammatical_texts, texts)
+for i, (src, tgt, augment) in enumerate(zip(ungrammatical_texts, texts, augments)):
     if augment:
         src_swapped, tgt_swapped = augment
         print(f'{i+1}\tSource: {src}\n\tTarget: {tgt}\n\tAligned: {align(src, tgt)}\n\tAugmented Swapped: {src_swapped}\n\tAugmented Target: {tgt_swapped}')
@@ -1,15 +1,31 @@
 import re
-from copy import deepcopy
+from functools import lru_cache
 from typing import List, Optional, Tuple
 import nltk
-nltk.download('wordnet')
+try:
+    nltk.data.find('corpora/wordnet')
+except LookupError:
+    nltk.download('wordnet', quiet=True)
 from nltk.stem import WordNetLemmatizer
-from st_augmentor import singular_they_augmentor
+from st_augmentor import (
+    ANNOTATION_PREFIX,
+    ANNOTATION_SUFFIX,
+    AnnotationMode,
+    singular_they_augmentor,
+    singular_they_augmentor_batch,
+)
 from utils import align, TokenAnnotation, AnnotatedTokens
 
 lemmatizer = WordNetLemmatizer()
+# Force WordNet's lazy corpus loader to load now rather than on the first alignment
+lemmatizer.lemmatize("run", pos="v")
 
+ANNOTATION_PATTERN = re.compile(
+    re.escape(ANNOTATION_PREFIX) + r"(\S*)" + re.escape(ANNOTATION_SUFFIX)
+)
 
+
+@lru_cache(maxsize=65536)
 def lemmatize_verb(text: str) -> str:
     return lemmatizer.lemmatize(text, pos="v")
 
@@ -35,35 +51,34 @@ def are_counterparts(source_str: str, target_str: str) -> bool:
     :param target_str: str
     :return: bool
     """
-    gendered_counterparts = source_str.casefold() in pronoun_map_st.get(
-        target_str.casefold(), []
+    source_cf = source_str.casefold()
+    target_cf = target_str.casefold()
+    if source_cf == target_cf:
+        return True
+    gendered_counterparts = source_cf in pronoun_map_st.get(target_cf, [])
+    copular_counterparts = (source_cf in ['is', '\'s']) and (target_cf in ['are', '\'re'])
+    return (
+        gendered_counterparts
+        or copular_counterparts
+        or lemmatize_verb(source_cf) == lemmatize_verb(target_cf)
     )
-    copular_counterparts = (source_str.casefold() in ['is', '\'s']) and (target_str.casefold() in ['are', '\'re'])
-    verbal_counterparts = lemmatize_verb(source_str.casefold()) == lemmatize_verb(target_str.casefold())
-    return gendered_counterparts | copular_counterparts | verbal_counterparts
 
 
-def align_annotation_text(
-    annotation: TokenAnnotation, annotation_pattern: re.Pattern
-) -> Optional[str]:
+def align_annotation_text(annotation: TokenAnnotation) -> Optional[str]:
     """
     Swaps a target token for a source token if the source token was swapped and they are counterparts. Otherwise, returns None.
     :param annotation: TokenAnnotation
-    :param annotation_pattern: re.Pattern
     :return: Optional[str]
     """
     def align_token_strings(source_str: str, target_str: str) -> Optional[str]:
         "Checks if token strings can be aligned."
-        if annotation_pattern.search(target_str) is not None:
-            target_str_clean = annotation_pattern.search(target_str).group(1)
-            if are_counterparts(source_str, target_str_clean):
-                return target_str_clean
-            else:
-                return None
-        else:
+        match = ANNOTATION_PATTERN.search(target_str)
+        if match is None:
             return source_str
+        target_str_clean = match.group(1)
+        return target_str_clean if are_counterparts(source_str, target_str_clean) else None
 
-    if annotation_pattern.search(annotation.suggestions[0]) is None:  # nothing to swap
+    if ANNOTATION_PATTERN.search(annotation.suggestions[0]) is None:  # nothing to swap
         return annotation.source_text
     source_tokens = annotation.source_text.split()
     suggestion_tokens = annotation.suggestions[0].split()
@@ -80,64 +95,100 @@ def align_annotation_text(
             return None
 
 
-def merge_aligned(
-    aligned_text: AnnotatedTokens, annotation_pattern: re.Pattern
-) -> Optional[str]:
+def merge_aligned(aligned_text: AnnotatedTokens) -> Optional[str]:
     """
     Merges in swapped tokens from the target text to the source text in an aligned text
-    if the swap is safe. If a swap isn't safe, returns None.
+    if the swap is safe. If a swap isn't safe, returns None. `aligned_text` is modified in place.
     :param aligned_text: AnnotatedTokens
-    :param annotation_pattern: re.Pattern
     :return: Optional[str]
     """
-    aligned_copy = deepcopy(aligned_text)
-    for annotation in aligned_copy.iter_annotations():
-        aligned_text = align_annotation_text(annotation, annotation_pattern)
-        if aligned_text == None:
+    corrections = []
+    for annotation in aligned_text.get_annotations():
+        aligned_annotation = align_annotation_text(annotation)
+        if aligned_annotation == None:
             return None
-        else:
-            annotation.suggestions[0] = aligned_text
-            aligned_copy.apply_correction(annotation)
-    return aligned_copy.get_corrected_text()
+        corrections.append((annotation, aligned_annotation))
+    aligned_text.apply_corrections(corrections)
+    return aligned_text.get_corrected_text()
 
 
-def gec_safe_swap_target(
-    source_str: str, target_str: str, annotation_pattern: re.Pattern
-) -> Optional[str]:
+def gec_safe_swap_target(source_str: str, target_str: str) -> Optional[str]:
     """
     Safely merges in swapped tokens from the target text to the source text. If the swap isn't safe, returns None.
     :param source_str: str
     :param target_str: str
-    :param annotation_pattern: re.Pattern
     :return: Optional[str]
     """
     aligned_text = align(source_str, target_str)
-    merged_source = merge_aligned(aligned_text, annotation_pattern)
+    merged_source = merge_aligned(aligned_text)
     return merged_source
 
 
-def st_augmentor_for_gec(source_str: str, target_str: str) -> Optional[Tuple[str, str]]:
+@lru_cache(maxsize=100_000)
+def _st_target_cached(target_str: str) -> Optional[str]:
     """
-    Given a source string and a target string, create singular they versions of these strings
-    if possible. If it's not possible, return None
-    :param source_str: str
+    Singular they version of a target string with the swapped tokens annotated, or None.
+    Cached because GEC corpora often pair many sources with the same target.
     :param target_str: str
-    :return: Optional[Tuple[str, str]]
+    :return: Optional[str]
     """
-    annotation = lambda x: "<<<{text}>>>".format(text=x)
-    annotation_pattern = re.compile(r"<<<(\S*)>>>")
-    st_target_str = singular_they_augmentor(
-        target_str, check_singular=True, annotation=annotation
+    return singular_they_augmentor(
+        target_str, check_singular=True, annotation_mode=AnnotationMode.WRAP
     )
+
+
+def swap_gec_pair(
+    source_str: str, st_target_str: Optional[str]
+) -> Optional[Tuple[str, str]]:
+    """
+    Given a source string and the annotated singular they version of its target, create
+    the singular they source and target strings if the swap is safe. Otherwise, return None.
+    :param source_str: str
+    :param st_target_str: Optional[str]
+    :return: Optional[Tuple[str, str]]
+    """
     if st_target_str is None:
         return None
+    st_source_str = gec_safe_swap_target(source_str, st_target_str)
+    if st_source_str is None:
+        return None
     else:
-        st_source_str = gec_safe_swap_target(
-            source_str, st_target_str, annotation_pattern
+        return st_source_str, ANNOTATION_PATTERN.sub(r"\1", st_target_str)
+
+
+def st_augmentor_for_gec_batch(
+    source_strs: List[str], target_strs: List[str]
+) -> List[Optional[Tuple[str, str]]]:
+    """
+    Given parallel lists of source and target strings, create singular they versions of each pair
+    if possible. The distinct targets are augmented in a single batch. Pairs that can't be augmented are None.
+    :param source_strs: List[str]
+    :param target_strs: List[str]
+    :return: List[Optional[Tuple[str, str]]]
+    """
+    unique_target_strs = list(dict.fromkeys(target_strs))
+    st_target_strs = dict(
+        zip(
+            unique_target_strs,
+            singular_they_augmentor_batch(
+                unique_target_strs,
+                check_singular=True,
+                annotation_mode=AnnotationMode.WRAP,
+            ),
         )
-        if st_source_str is None:
-            return None
-        else:
-            return st_source_str, annotation_pattern.sub(
-                lambda m: m.group(1), st_target_str
-            )
+    )
+    return [
+        swap_gec_pair(source_str, st_target_strs[target_str])
+        for source_str, target_str in zip(source_strs, target_strs)
+    ]
+
+
+def st_augmentor_for_gec(source_str: str, target_str: str) -> Optional[Tuple[str, str]]:
+    """
+    Given a source string and a target string, create singular they versions of these strings
+    if possible. If it's not possible, return None
+    :param source_str: str
+    :param target_str: str
+    :return: Optional[Tuple[str, str]]
+    """
+    return swap_gec_pair(source_str, _st_target_cached(target_str))
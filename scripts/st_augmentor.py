@@ -1,13 +1,40 @@
+import os
+import re
+from enum import Enum
+from functools import lru_cache
+from itertools import chain
+
 import spacy
 from spacy.tokens import Token, Span, Doc
 import pyinflect
-import neuralcoref
+import torch
+from fastcoref import FCoref
 
-from typing import Callable, List, Optional
+from typing import List, Optional, Set, Tuple, Union
 
-nlp = spacy.load("en_core_web_lg")
 
-neuralcoref.add_to_pipe(nlp)
+def _select_device() -> str:
+    """
+    Choose the device for spaCy and fastcoref. Defaults to the GPU when torch can see one;
+    set the GEC_ST_DEVICE environment variable to "cpu" or "cuda" to override.
+    spaCy must be switched to the GPU before the pipeline is loaded.
+    :return: str
+    """
+    requested = os.environ.get("GEC_ST_DEVICE")
+    if requested is None:
+        requested = "cuda" if torch.cuda.is_available() else "cpu"
+    if requested == "cpu":
+        return "cpu"
+    elif requested == "cuda":
+        spacy.prefer_gpu()
+        return "cuda:0"
+    else:
+        raise ValueError(f"GEC_ST_DEVICE must be 'cpu' or 'cuda', not {requested!r}")
+
+
+device = _select_device()
+
+coref_model = FCoref(device=device, enable_progress_bar=False)
 
 Token.set_extension("swapped_text", default="")
 Token.set_extension("has_swap", default=False)
@@ -15,12 +42,35 @@ Doc.set_extension("has_swap", default=False)
 Doc.set_extension("swapped_text", default="")
 Doc.set_extension("swap_clusters", default=[])
 
-sing_copulae = ["is", "was", "'s", "s"]
-pronouns = ["he", "she", "him", "her", "his", "himself", "herself", "hers"]
+ANNOTATION_PREFIX = "<<<"
+ANNOTATION_SUFFIX = ">>>"
+
 
-verbal_pos = ["VERB", "AUX"]
-subj_dep = ["nsubj", "nsubjpass"]
-aux_dep = ["aux", "auxpass"]
+class AnnotationMode(str, Enum):
+    NONE = "none"  # Swapped tokens are left as is
+    WRAP = "wrap"  # Swapped tokens are wrapped in ANNOTATION_PREFIX and ANNOTATION_SUFFIX
+
+
+sing_copulae = frozenset(["is", "was", "'s", "s"])
+pronouns = frozenset(["he", "she", "him", "her", "his", "himself", "herself", "hers"])
+pronoun_pattern = re.compile(
+    r"\b(?:{})\b".format("|".join(sorted(pronouns))), re.IGNORECASE
+)
+
+verbal_pos = frozenset(["VERB", "AUX"])
+subj_dep = frozenset(["nsubj", "nsubjpass"])
+aux_dep = frozenset(["aux", "auxpass"])
+
+
+@lru_cache(maxsize=None)
+def _get_nlp() -> spacy.language.Language:
+    """
+    Load the spaCy pipeline once. Only tagging, parsing, POS mapping (attribute_ruler)
+    and lemmas (needed by pyinflect) are used, so NER and the sentence recognizer are excluded.
+    Call `_get_nlp.cache_clear()` to force a reload.
+    :return: Language
+    """
+    return spacy.load("en_core_web_lg", exclude=["ner", "senter"])
 
 
 def token_is_nn(tok: Token) -> bool:
@@ -99,14 +149,11 @@ def get_agreeing_verb(tok: Token) -> Token:
     :param tok: Token
     :return: Token
     """
-    if any(child.pos_ == "AUX" and child.dep_ in aux_dep for child in tok.children):
-        # Pick the leftmost auxiliary child
-        agreeing_head = list(
-            filter(lambda x: x.pos_ == "AUX" and x.dep_ in aux_dep, tok.children)
-        )[0]
-    else:
-        agreeing_head = tok
-    return agreeing_head
+    # Pick the leftmost auxiliary child
+    for child in tok.children:
+        if child.pos_ == "AUX" and child.dep_ in aux_dep:
+            return child
+    return tok
 
 
 def get_conjoined_agr_verb(tok: Token) -> Optional[Token]:
@@ -133,13 +180,13 @@ def get_agr_verb_ids(tok: Token) -> Optional[List[int]]:
     :return: Optional[List[int]]
     """
     if tok.head.pos_ in verbal_pos and tok.dep_ in subj_dep:
-        agreeing_head = get_agreeing_verb(tok.head)
-        agreeing_children = list(
-            filter(
-                lambda x: x is not None, map(get_conjoined_agr_verb, tok.head.conjuncts)
-            )
+        ids = [get_agreeing_verb(tok.head).i]
+        ids.extend(
+            verb.i
+            for verb in map(get_conjoined_agr_verb, tok.head.conjuncts)
+            if verb is not None
         )
-        return list(map(lambda x: x.i, [agreeing_head, *agreeing_children]))
+        return ids
     else:
         return None
 
@@ -163,24 +210,14 @@ def get_plural_verb(tok: Token) -> str:
         return tok.text
 
 
-def get_cluster_roots(tok: Token) -> List[Token]:
-    """
-    Get the roots of the tokens in the coref cluster for an input token.
-    :param tok: Token
-    :return: List[Token]
-    """
-    roots = [span.root for cluster in tok._.coref_clusters for span in cluster]
-    return roots
-
-
-def token_is_singleton(tok: Token) -> bool:
+def token_is_singleton(tok: Token, root_ids: Set[int]) -> bool:
     """
     Checks if a token is not part of some larger span.
     :param tok: Token
+    :param root_ids: Set[int]
     :return: bool
     """
-    roots = get_cluster_roots(tok)
-    return tok not in roots
+    return tok.i not in root_ids
 
 
 def match_tok_case(tok: Token, text: str) -> str:
@@ -219,80 +256,112 @@ def get_plural_pronoun(tok: Token) -> str:
         return match_tok_case(tok, "them")
 
 
-def cluster_has_pronoun(cluster: List[Span]) -> bool:
+def cluster_has_pronoun(cluster_root_ids: List[int], pronoun_ids: Set[int]) -> bool:
     """
     Return True if the coreference cluster has a pronoun.
-    :param cluster: List[Span]
+    :param cluster_root_ids: List[int], indices of the roots of the cluster's spans
+    :param pronoun_ids: Set[int], indices of the pronominal span roots in the doc
     :return: bool
     """
-    return any(span.root.text.casefold() in pronouns for span in cluster)
+    return not pronoun_ids.isdisjoint(cluster_root_ids)
 
 
-def cluster_is_singular(cluster: List[Span]) -> bool:
+def cluster_is_singular(cluster_root_ids: List[int], singular_ids: Set[int]) -> bool:
     """
     Return True if any of the spans in the cluster are singular.
     Singular spans indicate that swapping would result in unambiguous
     singular "they".
-    :param cluster: List[Span]
+    :param cluster_root_ids: List[int], indices of the roots of the cluster's spans
+    :param singular_ids: Set[int], indices of the singular span roots in the doc
     :return: bool
     """
-    return any(token_is_singular(span.root) for span in cluster)
+    return not singular_ids.isdisjoint(cluster_root_ids)
 
 
 def set_swapped_token_text(
-    tok: Token, annotation: Optional[Callable[[str], str]] = None
+    tok: Token, annotation_mode: AnnotationMode = AnnotationMode.NONE
 ) -> None:
     """
     Set the swapped replacement text for the token. I.e., "they" or
-    a verb with 3PL morphological agreement. Swapped tokens can be noted
-    by specifying an annotation function in the `annotation` argument.
+    a verb with 3PL morphological agreement. With `annotation_mode` set to
+    AnnotationMode.WRAP, swapped tokens are wrapped in ANNOTATION_PREFIX and ANNOTATION_SUFFIX.
     :param tok: Token
-    :param annotation: Optional[Callable[[str], str]]
+    :param annotation_mode: AnnotationMode
     :return: None
     """
-    if not annotation:
-        annotation = lambda x: x
+    wrap = annotation_mode == AnnotationMode.WRAP
     if tok.text.casefold() in pronouns:
         tok._.has_swap = True
         tok.doc._.has_swap = True
-        tok._.swapped_text = annotation(get_plural_pronoun(tok))
+        plural_pronoun = get_plural_pronoun(tok)
+        if wrap:
+            plural_pronoun = ANNOTATION_PREFIX + plural_pronoun + ANNOTATION_SUFFIX
+        tok._.swapped_text = plural_pronoun
         agr_verb_ids = get_agr_verb_ids(tok)
         if agr_verb_ids:
             for id in agr_verb_ids:
-                tok.doc[id]._.swapped_text = annotation(get_plural_verb(tok.doc[id]))
+                plural_verb = get_plural_verb(tok.doc[id])
+                if wrap and plural_verb:
+                    plural_verb = ANNOTATION_PREFIX + plural_verb + ANNOTATION_SUFFIX
+                tok.doc[id]._.swapped_text = plural_verb
+
+
+def get_coref_clusters(doc: Doc, clusters: List[List[Tuple[int, int]]]) -> List[List[Span]]:
+    """
+    Map the character-offset coref clusters predicted by fastcoref onto spans of the doc.
+    Mentions that do not fall on token boundaries are dropped.
+    :param doc: Doc
+    :param clusters: List[List[Tuple[int, int]]]
+    :return: List[List[Span]]
+    """
+    span_clusters = []
+    for cluster in clusters:
+        spans = [doc.char_span(start, end) for start, end in cluster]
+        spans = [span for span in spans if span is not None]
+        if spans:
+            span_clusters.append(spans)
+    return span_clusters
 
 
 def set_swapped_doc_text(
     doc: Doc,
+    clusters: List[List[Span]],
     check_singular: bool = True,
-    annotation: Optional[Callable[[str], str]] = None,
+    annotation_mode: AnnotationMode = AnnotationMode.NONE,
 ) -> None:
     """
     Determine if the doc has a swappable cluster and set the swapped text. Swapped tokens can be noted
-    by specifying an annotation function in the `annotation` argument.
+    by setting `annotation_mode` to AnnotationMode.WRAP.
     :param doc: Doc
+    :param clusters: List[List[Span]]
     :param check_singular: bool
-    :param annotation: Optional[Callable[[str], str]]
+    :param annotation_mode: AnnotationMode
     :return: None
     """
     if check_singular:
-        if doc._.has_coref:
-            for cluster in doc._.coref_clusters:
-                if cluster_is_singular(cluster) and cluster_has_pronoun(cluster):
-                    doc._.swap_clusters.append(cluster)
-                    for span in cluster:
-                        set_swapped_token_text(span.root, annotation)
-        for tok in doc:
-            if (
-                tok.text.casefold() in pronouns
-                and token_is_singleton(tok)
-                and token_has_nn_attr(tok)
+        cluster_root_ids = [[span.root.i for span in cluster] for cluster in clusters]
+        root_ids = set(chain.from_iterable(cluster_root_ids))
+        # Evaluate the token predicates once per span root, however many clusters share it
+        singular_ids = {i for i in root_ids if token_is_singular(doc[i])}
+        pronoun_ids = {i for i in root_ids if doc[i].text.casefold() in pronouns}
+        swap_clusters = []
+        swap_ids = set()
+        for cluster, ids in zip(clusters, cluster_root_ids):
+            if cluster_is_singular(ids, singular_ids) and cluster_has_pronoun(
+                ids, pronoun_ids
             ):
-                set_swapped_token_text(tok, annotation)
-    else:
-        for tok in doc:
-            if tok.text.casefold() in pronouns:
-                set_swapped_token_text(tok, annotation)
+                swap_clusters.append(cluster)
+                swap_ids.update(ids)
+        doc._.swap_clusters = swap_clusters
+    for tok in doc:
+        if tok.text.casefold() not in pronouns:
+            continue
+        if (
+            not check_singular
+            or tok.i in swap_ids
+            or (token_is_singleton(tok, root_ids) and token_has_nn_attr(tok))
+        ):
+            set_swapped_token_text(tok, annotation_mode)
 
 
 def get_swapped_string(doc: Doc) -> str:
@@ -301,34 +370,74 @@ def get_swapped_string(doc: Doc) -> str:
     :param doc: Doc
     :return: str
     """
-    swapped_str = ""
+    parts = []
     for tok in doc:
-        if tok._.swapped_text:
-            swapped_str += str(tok._.swapped_text) + str(tok.whitespace_)
-        else:
-            swapped_str += tok.text_with_ws
-    return swapped_str
+        parts.append(tok._.swapped_text if tok._.swapped_text else tok.text)
+        parts.append(tok.whitespace_)
+    return "".join(parts)
+
+
+def singular_they_augmentor_batch(
+    texts: List[str],
+    check_singular: bool = True,
+    annotation_mode: AnnotationMode = AnnotationMode.NONE,
+    batch_size: int = 64,
+    return_docs: bool = False,
+) -> Union[List[Optional[str]], List[Tuple[Optional[str], Optional[Doc]]]]:
+    """
+    Perform singular-they augmentation for a batch of texts. Coreference is predicted for
+    the whole batch at once and spaCy parses the texts with `nlp.pipe` in batches of
+    `batch_size`. Returns None for the texts where no augmentation is possible.
+    If `check_singular` is True, swaps are only performed if result would have singular
+    coreference. Swapped tokens can be noted by setting `annotation_mode` to
+    AnnotationMode.WRAP. If `return_docs` is True, each result is paired with the parsed
+    Doc, or None if the text had no pronoun and wasn't parsed.
+    :param texts: List[str]
+    :param check_singular: bool
+    :param annotation_mode: AnnotationMode
+    :param batch_size: int
+    :param return_docs: bool
+    :return: Union[List[Optional[str]], List[Tuple[Optional[str], Optional[Doc]]]]
+    """
+    swapped_texts = [None] * len(texts)
+    # Docs are only kept on request, otherwise each is freed once processed
+    parsed_docs = [None] * len(texts) if return_docs else None
+    # Only texts containing a swappable pronoun can be augmented, so skip parsing the rest
+    candidate_ids = [i for i, text in enumerate(texts) if pronoun_pattern.search(text)]
+    if candidate_ids:
+        candidates = [texts[i] for i in candidate_ids]
+        preds = coref_model.predict(texts=candidates, max_tokens_in_batch=2048)
+        docs = _get_nlp().pipe(candidates, batch_size=batch_size)
+        for i, doc, pred in zip(candidate_ids, docs, preds):
+            clusters = get_coref_clusters(doc, pred.get_clusters(as_strings=False))
+            set_swapped_doc_text(doc, clusters, check_singular, annotation_mode)
+            if doc._.has_swap:
+                swapped_texts[i] = get_swapped_string(doc)
+            if return_docs:
+                parsed_docs[i] = doc
+    if return_docs:
+        return list(zip(swapped_texts, parsed_docs))
+    return swapped_texts
 
 
 def singular_they_augmentor(
     text: str,
     check_singular: bool = True,
-    annotation: Optional[Callable[[str], str]] = None,
-) -> Optional[str]:
+    annotation_mode: AnnotationMode = AnnotationMode.NONE,
+    return_doc: bool = False,
+) -> Union[Optional[str], Tuple[Optional[str], Optional[Doc]]]:
     """
     Perform singular-they augmentation. Returns None if no augmentation is
     possible for the given text. If `check_singular` is True, swaps
     are only performed if result would have singular coreference. Swapped tokens can be noted
-    by specifying an annotation function in the `annotation` argument.
+    by setting `annotation_mode` to AnnotationMode.WRAP. If `return_doc` is True,
+    the result is paired with the parsed Doc (None if the text wasn't parsed).
     :param text: str
     :param check_singular: bool
-    :param annotation: Optional[Callable[[str], str]]
-    :return: Optional[str]
+    :param annotation_mode: AnnotationMode
+    :param return_doc: bool
+    :return: Union[Optional[str], Tuple[Optional[str], Optional[Doc]]]
     """
-    doc = nlp(text)
-    set_swapped_doc_text(doc, check_singular, annotation)
-    if doc._.has_swap:
-        swapped_text = get_swapped_string(doc)
-    else:
-        swapped_text = None
-    return swapped_text
+    return singular_they_augmentor_batch(
+        [text], check_singular, annotation_mode, return_docs=return_doc
+    )[0]
@@ -1,4 +1,5 @@
 import difflib
+import sys
 
 from .annotated_tokens import AnnotatedTokens
 
@@ -18,8 +19,10 @@ def align(source, target):
         <AnnotatedTokens('{Hello=>Hey} world')>
     """
 
-    if isinstance(source, str):
-        source = source.split()
+    if not isinstance(source, list):
+        source = _get_tokens(source)
+    if not isinstance(target, list):
+        target = _get_tokens(target)
 
     ann_tokens = AnnotatedTokens(source)
     for diff in _gen_diffs(source, target):
@@ -28,14 +31,23 @@ def align(source, target):
     return ann_tokens
 
 
-def _gen_diffs(original, translation, merge=True):
-    tokens = _get_tokens(original)
-    translation_tokens = _get_tokens(translation)
+def _gen_diffs(tokens, translation_tokens, merge=True):
+    """Yield (start, end, replacement) for every non-equal block.
 
-    matcher = difflib.SequenceMatcher(None, tokens, translation_tokens)
-    diffs = list(matcher.get_opcodes())
+    Both arguments are token lists; they are not copied.
+    """
+
+    if tokens == translation_tokens:  # unchanged pair, nothing to align
+        return
+
+    # Interned tokens let difflib's dict lookups compare by identity
+    matcher = difflib.SequenceMatcher(
+        None,
+        [sys.intern(tok) for tok in tokens],
+        [sys.intern(tok) for tok in translation_tokens],
+    )
 
-    for diff in diffs:
+    for diff in matcher.get_opcodes():
         if _tag(diff) == "equal":
             continue
 
@@ -1,6 +1,9 @@
 import inspect
+import sys
+from bisect import bisect_left, bisect_right
 from collections import namedtuple
 from enum import Enum
+from itertools import accumulate
 
 NO_SUGGESTIONS = "NO_SUGGESTIONS"
 DEFAULT = object()
@@ -21,11 +24,14 @@ class OnOverlap(str, Enum):
 class MutableTokens:
     """Represents list of tokens that can be modified."""
 
+    __slots__ = ("_tokens", "_edits", "_spans")
+
     def __init__(self, tokens):
         if isinstance(tokens, str):
             tokens = tokens.strip().split(" ")
         self._tokens = tokens
-        self._edits = []
+        self._edits = []  # kept sorted by (start, end)
+        self._spans = []  # (start, end) of each edit, for bisecting
 
     def __str__(self):
         """Pretend to be a normal string."""
@@ -43,12 +49,16 @@ class MutableTokens:
             >>> t.get_edited_text()
             'the brown fox'
         """
-        self._edits.append((start, end, value))  # TODO: keep _edits sorted?
+        # Edits with equal spans keep the order they were made in
+        i = bisect_right(self._spans, (start, end))
+        self._spans.insert(i, (start, end))
+        self._edits.insert(i, (start, end, value))
 
     def apply_edits(self):
         """Applies all edits made so far."""
         self._tokens = self.get_edited_tokens()
         self._edits = []
+        self._spans = []
 
     def get_source_tokens(self):
         """Return list of tokens without pending edits applied.
@@ -80,22 +90,95 @@ class MutableTokens:
                 This signals the error is highlighted but no suggestion was
                 provided.
         """
-        result = []
-        i = 0
-        t = self._tokens
-        for begin, end, val in sorted(self._edits, key=lambda x: (x[0], x[1])):
-            result.extend(t[i:begin])
-            if not highlight and "NO_SUGGESTIONS" in val:
-                result.extend(t[begin:end])
-            elif val:
-                result.extend(val.split(" "))
-            i = end
-        result.extend(t[i:])
-        return result
+        return _splice(self._tokens, self._edits, highlight=highlight)
 
     def get_edited_text(self, *, highlight=False):
         """Return text with all corrections applied."""
-        return " ".join(self.get_edited_tokens(highlight=highlight))
+        return " ".join(
+            _splice(self._tokens, self._edits, highlight=highlight, as_text=True)
+        )
+
+
+def _splice(tokens, edits, *, highlight=False, as_text=False):
+    """Replace spans of tokens with values of sorted (start, end, value) edits.
+
+    Args:
+        highlight (bool): If True, keep NO_SUGGESTIONS markup in values.
+        as_text (bool): If True, return chunks of text to be joined by space
+            instead of single tokens, which saves splitting the values and
+            joining unchanged tokens one by one.
+    """
+
+    result = []
+    if as_text:
+
+        def add(seg):
+            if seg:
+                result.append(" ".join(seg))
+
+        add_value = result.append
+    else:
+        add = result.extend
+
+        def add_value(val):
+            result.extend(val.split(" "))
+
+    i = 0
+    for begin, end, val in edits:
+        add(tokens[i:begin])
+        if not highlight and NO_SUGGESTIONS in val:
+            add(tokens[begin:end])
+        elif val:
+            add_value(val)
+        i = end
+    add(tokens[i:])
+    return result
+
+
+class _SpanIndex:
+    """Annotations ordered by (start, end) for fast overlap lookups.
+
+    Besides the sorted spans, the index keeps the running maximum of the
+    ends. Spans before the first running maximum that reaches `begin` end
+    too early to overlap [begin, end), and spans after the last start not
+    greater than `end` begin too late, so only the spans in between have to
+    be checked.
+    """
+
+    def __init__(self, annotations=()):
+        self._anns = sorted(annotations, key=lambda a: (a.start, a.end))
+        self._keys = [(ann.start, ann.end) for ann in self._anns]
+        self._max_ends = list(accumulate((ann.end for ann in self._anns), max))
+
+    def add(self, ann):
+        """Insert annotation keeping the index ordered."""
+
+        key = (ann.start, ann.end)
+        i = bisect_right(self._keys, key)
+        self._anns.insert(i, ann)
+        self._keys.insert(i, key)
+        max_end = max(self._max_ends[i - 1], ann.end) if i else ann.end
+        self._max_ends.insert(i, max_end)
+        for j in range(i + 1, len(self._max_ends)):
+            if self._max_ends[j] >= ann.end:
+                break
+            self._max_ends[j] = ann.end
+
+    def sorted_annotations(self):
+        """Return all annotations ordered by (start, end)."""
+
+        return self._anns
+
+    def overlapping(self, start, end):
+        """Return annotations that overlap with the range [start, end)."""
+
+        lo = bisect_left(self._max_ends, start)
+        hi = bisect_left(self._keys, (end + 1,))
+        return [
+            ann
+            for ann in self._anns[lo:hi]
+            if _spans_overlap(ann.start, ann.end, start, end)
+        ]
 
 
 class AnnotatedTokens:
@@ -116,6 +199,8 @@ class AnnotatedTokens:
         """
 
         self._annotations = []
+        self._index = None  # _SpanIndex over _annotations, built on demand
+        self._by_span = None  # first annotation at each (start, end)
         if isinstance(tokens, str):
             self._tokens = tokens.split(" ")
         else:
@@ -163,6 +248,61 @@ class AnnotatedTokens:
             'the {red=>brown|white} fox'
         """
 
+        new_ann = self._make_annotation(start, end, correct_value, meta)
+        overlapping = self._get_overlaps(start, end)
+        if overlapping:
+            self._handle_overlap(overlapping, new_ann, on_overlap)
+        else:
+            self._append(new_ann)
+
+    def annotate_many(self, items, on_overlap=OnOverlap.ERROR):
+        """Annotate several sublists at once.
+
+        The result is the same as calling `annotate` for each item in order,
+        but annotations that do not overlap anything are collected and added
+        in bulk instead of one at a time.
+
+        Args:
+            items: iterable of (start, end, correct_value) or
+                (start, end, correct_value, meta) tuples, with the same
+                meaning as `annotate` arguments.
+            on_overlap: action to take when an item overlaps an existing
+                annotation, see `annotate`.
+
+        Example:
+            >>> t = AnnotatedTokens('the red fox')
+            >>> t.annotate_many([(0, 1, 'a'), (1, 2, 'brown'), (1, 2, 'x')],
+            ...                 on_overlap=OnOverlap.SAVE_OLD)
+            >>> t.get_annotated_text()
+            '{the=>a} {red=>brown} fox'
+        """
+
+        pending = []
+        pending_index = _SpanIndex()
+        try:
+            for item in items:
+                new_ann = self._make_annotation(*item)
+                start, end = new_ann.start, new_ann.end
+                if not (
+                    self._get_overlaps(start, end)
+                    or pending_index.overlapping(start, end)
+                ):
+                    pending.append(new_ann)
+                    pending_index.add(new_ann)
+                elif on_overlap != OnOverlap.SAVE_OLD:
+                    # Other actions may change or look at the annotations, so
+                    # they see everything added before the current item
+                    self._extend(pending)
+                    pending = []
+                    pending_index = _SpanIndex()
+                    overlapping = self._get_overlaps(start, end)
+                    self._handle_overlap(overlapping, new_ann, on_overlap)
+        finally:
+            self._extend(pending)
+
+    def _make_annotation(self, start, end, correct_value, meta=None):
+        """Validate `annotate` arguments and build an annotation from them."""
+
         if start > end:
             raise ValueError(
                 f"Start positition {start} should not greater "
@@ -173,6 +313,9 @@ class AnnotatedTokens:
             meta = dict()
 
         bad = " ".join(self._tokens[start:end])
+        if end - start <= 3:
+            # Short spans are mostly common words, share a single copy
+            bad = sys.intern(bad)
 
         if isinstance(correct_value, str):
             suggestions = [correct_value]
@@ -181,42 +324,50 @@ class AnnotatedTokens:
         else:
             suggestions = list(correct_value)
 
-        new_ann = TokenAnnotation(start, end, bad, suggestions, meta)
-        overlapping = self._get_overlaps(start, end)
-        if overlapping:
-            if callable(on_overlap):
-                on_overlap(self, overlapping, new_ann)
-            elif on_overlap == OnOverlap.SAVE_OLD:
-                pass
-            elif on_overlap == OnOverlap.OVERRIDE:
-                for ann in overlapping:
-                    self.remove(ann)
-                self._annotations.append(new_ann)
-            elif on_overlap == OnOverlap.ERROR:
-                raise OverlapError(
-                    f"Overlap detected: positions ({start}, {end}) with "
-                    f"{len(overlapping)} existing annotations."
-                )
-            elif on_overlap == OnOverlap.MERGE_STRICT:
-                merge_strict(self, overlapping, new_ann)
-            elif on_overlap == OnOverlap.MERGE_EXPAND:
-                merge_expand(self, overlapping, new_ann)
-            else:
-                raise ValueError(f"Unknown on_overlap action: {on_overlap}")
+        return TokenAnnotation(start, end, bad, suggestions, meta)
+
+    def _handle_overlap(self, overlapping, new_ann, on_overlap):
+        """Resolve overlap of a new annotation with existing ones."""
+
+        if callable(on_overlap):
+            handler = on_overlap
         else:
-            self._annotations.append(new_ann)
+            handler = _OVERLAP_HANDLERS.get(on_overlap)
+            if handler is None:
+                raise ValueError(f"Unknown on_overlap action: {on_overlap}")
+        handler(self, overlapping, new_ann)
+
+    def _append(self, ann):
+        """Add annotation, keeping the span index up to date."""
+
+        self._annotations.append(ann)
+        if self._index is not None:
+            self._index.add(ann)
+        if self._by_span is not None:
+            self._by_span.setdefault((ann.start, ann.end), ann)
+
+    def _extend(self, anns):
+        """Add several annotations, rebuilding the span index once."""
+
+        if anns:
+            self._annotations.extend(anns)
+            self._invalidate()
+
+    def _invalidate(self):
+        """Drop everything derived from the annotations or tokens."""
+
+        self._index = None
+        self._by_span = None
 
     def _get_overlaps(self, start, end):
         """Find all annotations that overlap with given range."""
 
-        res = []
-        for ann in self._annotations:
-            if span_intersect([(ann.start, ann.end)], start, end) != -1:
-                res.append(ann)
-            elif start == end and ann.start == ann.end and start == ann.start:
-                res.append(ann)
+        return self._get_index().overlapping(start, end)
 
-        return res
+    def _get_index(self):
+        if self._index is None:
+            self._index = _SpanIndex(self._annotations)
+        return self._index
 
     def get_annotations(self):
         """Return list of all annotations in the text."""
@@ -258,9 +409,11 @@ class AnnotatedTokens:
     def get_annotation_at(self, start, end):
         """Return annotation for the region (start, end) or None."""
 
-        for ann in self._annotations:
-            if ann.start == start and ann.end == end:
-                return ann
+        if self._by_span is None:
+            self._by_span = {}
+            for ann in self._annotations:
+                self._by_span.setdefault((ann.start, ann.end), ann)
+        return self._by_span.get((start, end))
 
     def remove(self, annotation):
         """Remove annotation, replacing it with the original text."""
@@ -269,6 +422,7 @@ class AnnotatedTokens:
             self._annotations.remove(annotation)
         except ValueError:
             raise ValueError("{} is not in the list".format(annotation))
+        self._invalidate()
 
     def filter_annotations(self, f=None):
         """Filter annotations using function passed as an argument.
@@ -279,14 +433,15 @@ class AnnotatedTokens:
              remove annotation.
         """
 
-        f_param = inspect.signature(f).parameters.values() if f else []
-        if len(f_param) not in [1, 2]:
+        n_params = _count_params(f) if f else 0
+        if n_params not in [1, 2]:
+            f_param = inspect.signature(f).parameters.values() if f else []
             raise ValueError(
                 "Filter function only accepts 1 or 2 arguments."
                 "Arguments received: {}".format(f_param)
             )
         for ann in self.iter_annotations():
-            if len(f_param) == 2:
+            if n_params == 2:
                 result = f(ann, self)
             else:
                 result = f(ann)
@@ -306,10 +461,17 @@ class AnnotatedTokens:
             'ONE {too=>two}'
         """
 
+        n_suggestions = len(annotation.suggestions)
+        if n_suggestions and not -n_suggestions <= level < n_suggestions:
+            raise IndexError(
+                f"Suggestion level {level} is out of range for {annotation}"
+            )
+
         try:
             self._annotations.remove(annotation)
         except ValueError:
             raise ValueError("{} is not in the list".format(annotation))
+        self._invalidate()
 
         tokens = MutableTokens(self._tokens)
         if annotation.suggestions:
@@ -324,11 +486,63 @@ class AnnotatedTokens:
         old_len = len(source_text.split(" ")) if source_text else 0
         new_len = len(repl.split(" ")) if repl else 0
         delta = new_len - old_len
+        if not delta:
+            return
         for i, a in enumerate(self._annotations):
             if a.start >= annotation.start:
                 a = a._replace(start=a.start + delta, end=a.end + delta)
                 self._annotations[i] = a
 
+    def apply_corrections(self, corrections):
+        """Remove several annotations, replacing each with the given text.
+
+        Unlike calling `apply_correction` in a loop, tokens are rebuilt and
+        the remaining annotations are shifted only once.
+
+        Args:
+            corrections: iterable of (annotation, replacement) pairs, where
+                replacement is a token list joined by space.
+
+        Example:
+            >>> tokens = AnnotatedTokens('one too three')
+            >>> tokens.annotate(0, 1, 'ONE')
+            >>> tokens.annotate(1, 2, 'two')
+            >>> tokens.annotate(2, 3, 'THREE')
+            >>> one, too, _ = tokens.get_annotations()
+            >>> tokens.apply_corrections([(one, 'One'), (too, 'two 2')])
+            >>> tokens.get_annotated_text()
+            'One two 2 {three=>THREE}'
+        """
+
+        corrections = list(corrections)
+        for annotation, _ in corrections:
+            try:
+                self._annotations.remove(annotation)
+            except ValueError:
+                raise ValueError("{} is not in the list".format(annotation))
+        self._invalidate()
+
+        tokens = MutableTokens(self._tokens)
+        shifts = []
+        for annotation, repl in corrections:
+            tokens.replace(annotation.start, annotation.end, repl)
+            source_text = annotation.source_text
+            old_len = len(source_text.split(" ")) if source_text else 0
+            new_len = len(repl.split(" ")) if repl else 0
+            shifts.append((annotation.start, new_len - old_len))
+        self._tokens = tokens.get_edited_tokens()
+
+        # Adjust other annotations by the total delta of corrections before them
+        shifts.sort()
+        pivots = [pivot for pivot, _ in shifts]
+        deltas = list(accumulate(delta for _, delta in shifts))
+        for i, a in enumerate(self._annotations):
+            n_before = bisect_right(pivots, a.start)
+            if n_before and deltas[n_before - 1]:
+                delta = deltas[n_before - 1]
+                a = a._replace(start=a.start + delta, end=a.end + delta)
+                self._annotations[i] = a
+
     def get_original_tokens(self):
         """Return the original (unannotated) tokens.
 
@@ -363,14 +577,7 @@ class AnnotatedTokens:
             ['Hello', 'world', '!']
         """
 
-        tokens = MutableTokens(self._tokens)
-        for ann in self._annotations:
-            try:
-                tokens.replace(ann.start, ann.end, ann.suggestions[level])
-            except IndexError:
-                pass
-
-        return tokens.get_edited_tokens()
+        return self._render("corrected", level=level)
 
     def get_corrected_text(self, level=0):
         """Return the corrected (unannotated) text.
@@ -382,7 +589,7 @@ class AnnotatedTokens:
             'Hello world !'
         """
 
-        return " ".join(self.get_corrected_tokens(level))
+        return " ".join(self._render("corrected", level=level, as_text=True))
 
     def get_annotated_text(self, *, with_meta=True):
         """Return the annotated tokens in text format.
@@ -396,11 +603,31 @@ class AnnotatedTokens:
             '{helo .=>Hello ,:::key=value} world!'
         """
 
-        tokens = MutableTokens(self._tokens)
-        for ann in self._annotations:
-            tokens.replace(ann.start, ann.end, ann.to_str(with_meta=with_meta))
+        return " ".join(self._render("annotated", with_meta=with_meta, as_text=True))
 
-        return " ".join(tokens.get_edited_tokens(highlight=True))
+    def _render(self, mode, *, level=0, with_meta=True, as_text=False):
+        """Return tokens with every annotation rendered in a single pass.
+
+        Args:
+            mode (str): "corrected" replaces annotations with their suggestion
+                at `level` (annotations without one are left as is),
+                "annotated" replaces them with their markup.
+            as_text (bool): If True, return chunks of text instead of tokens,
+                see `_splice`.
+        """
+
+        anns = self._get_index().sorted_annotations()
+        if mode == "annotated":
+            edits = ((a.start, a.end, a.to_str(with_meta=with_meta)) for a in anns)
+        else:
+            edits = [
+                (ann.start, ann.end, ann.suggestions[level])
+                for ann in anns
+                if -len(ann.suggestions) <= level < len(ann.suggestions)
+            ]
+        return _splice(
+            self._tokens, edits, highlight=mode == "annotated", as_text=as_text
+        )
 
     def combine(self, other, discard_overlap=True):
         """Combine annotations with other text's annotations.
@@ -419,18 +646,21 @@ class AnnotatedTokens:
                 )
             )
 
-        if self.get_original_text() != other.get_original_text():
+        # Equal token lists are the common case and need no joining
+        if (
+            self._tokens != other._tokens
+            and self.get_original_text() != other.get_original_text()
+        ):
             raise ValueError("Cannot combine with text from different " "original text")
 
         on_overlap = "save_old" if discard_overlap else "error"
-        for ann in other.get_annotations():
-            self.annotate(
-                ann.start,
-                ann.end,
-                ann.suggestions,
-                meta=ann.meta,
-                on_overlap=on_overlap,
-            )
+        self.annotate_many(
+            (
+                (ann.start, ann.end, ann.suggestions, ann.meta)
+                for ann in other.get_annotations()
+            ),
+            on_overlap=on_overlap,
+        )
 
 
 class TokenAnnotation(
@@ -452,6 +682,8 @@ class TokenAnnotation(
     def __new__(cls, start, end, source_text, suggestions, meta=DEFAULT):
         if meta is DEFAULT:
             meta = {}
+        if not isinstance(suggestions, list):
+            suggestions = list(suggestions)
         return super().__new__(cls, start, end, source_text, suggestions, meta)
 
     def __hash__(self):
@@ -461,7 +693,7 @@ class TokenAnnotation(
                 self.end,
                 self.source_text,
                 tuple(self.suggestions),
-                tuple(self.meta.items()),
+                frozenset(self.meta.items()),
             )
         )
 
@@ -470,8 +702,8 @@ class TokenAnnotation(
             self.start == other.start
             and self.end == other.end
             and self.source_text == other.source_text
-            and tuple(self.suggestions) == tuple(other.suggestions)
-            and tuple(sorted(self.meta.items())) == tuple(sorted(other.meta.items()))
+            and self.suggestions == other.suggestions
+            and self.meta == other.meta
         )
 
     @property
@@ -494,22 +726,37 @@ class TokenAnnotation(
         else:
             repl = NO_SUGGESTIONS
 
-        meta_text = self._format_meta() if with_meta else ""
-        return "{%s=>%s%s}" % (self.source_text, repl, meta_text)
+        meta_text = self._format_meta() if with_meta and self.meta else ""
+        return f"{{{self.source_text}=>{repl}{meta_text}}}"
 
     def _format_meta(self):
-        return "".join(":::{}={}".format(k, v) for k, v in self.meta.items())
+        return "".join([f":::{k}={v}" for k, v in self.meta.items()])
+
+
+def _count_params(f):
+    """Return the number of parameters `f` accepts.
+
+    Plain functions are answered from their code object, which is much
+    cheaper than `inspect.signature`. Anything else (methods, partials,
+    wrapped or variadic functions) goes through `inspect`.
+    """
+
+    code = getattr(f, "__code__", None)
+    if (
+        inspect.isfunction(f)
+        and not hasattr(f, "__wrapped__")
+        and not code.co_kwonlyargcount
+        and not code.co_flags & (inspect.CO_VARARGS | inspect.CO_VARKEYWORDS)
+    ):
+        return code.co_argcount
+
+    return len(inspect.signature(f).parameters)
 
 
 def _unique_list(array):
     """Leave only unique elements in the list saving their order."""
 
-    res = []
-    for x in array:
-        if x not in res:
-            res.append(x)
-
-    return res
+    return list(dict.fromkeys(array))
 
 
 def merge_strict(text, overlapping, new_ann):
@@ -571,9 +818,43 @@ def merge_expand(text, overlapping, new_ann):
     text.annotate(start, end, suggestions, meta=meta, on_overlap=OnOverlap.ERROR)
 
 
+def _keep_old(text, overlapping, new_ann):
+    """On-overlap handler that discards the new annotation."""
+
+
+def _override(text, overlapping, new_ann):
+    """On-overlap handler that replaces existing annotations with the new one."""
+
+    for ann in overlapping:
+        text.remove(ann)
+    text._append(new_ann)
+
+
+def _raise_overlap(text, overlapping, new_ann):
+    """On-overlap handler that refuses overlapping annotations."""
+
+    raise OverlapError(
+        f"Overlap detected: positions ({new_ann.start}, {new_ann.end}) "
+        f"with {len(overlapping)} existing annotations."
+    )
+
+
+# Handlers for the built-in OnOverlap actions
+_OVERLAP_HANDLERS = {
+    OnOverlap.ERROR: _raise_overlap,
+    OnOverlap.OVERRIDE: _override,
+    OnOverlap.SAVE_OLD: _keep_old,
+    OnOverlap.MERGE_STRICT: merge_strict,
+    OnOverlap.MERGE_EXPAND: merge_expand,
+}
+
+
 def span_intersect(spans, begin, end):
     """Check if interval [begin, end) intersects with any of given spans.
 
+    Null spans (begin == end) intersect with ranges they are strictly inside
+    of and with the same null span.
+
     Args:
         spans: list of (begin, end) pairs.
         begin (int): starting position of the query interval.
@@ -584,17 +865,17 @@ def span_intersect(spans, begin, end):
             or -1 if no such span exists.
     """
 
-    def strictly_inside(a, b, x, y):
-        """Test that first segment is strictly inside second one."""
-        return x < a <= b < y
-
     for index, (b, e) in enumerate(spans):
-        overlap = max(0, min(end, e) - max(begin, b))
-        if overlap:
-            return index
-        if strictly_inside(b, e, begin, end):
-            return index
-        if strictly_inside(begin, end, b, e):
+        if _spans_overlap(b, e, begin, end):
             return index
 
     return -1
+
+
+def _spans_overlap(b, e, begin, end):
+    return (
+        max(begin, b) < min(end, e)
+        or (b == e and begin < b < end)
+        or (begin == end and b < begin < e)
+        or (b == e == begin == end)
+    )